@@ -7,7 +7,7 @@
 # Future TODO:  1) Create a master data file
 #               2) Backup that master data file on google drive or equivalent
 
-import os, re, pprint, openpyxl, getpass
+import os, re, sys, json, zipfile, pprint, openpyxl, getpass
 from pathlib import Path
 from openpyxl.styles import Alignment, Font 
 from openpyxl.chart import ScatterChart, Reference, Series
@@ -74,6 +74,75 @@ def calcAvg(data, columnIndex, startIndex, endIndex):
 
     return sum / numSamples
 
+# Function that saves a workbook without ever leaving a half-written file behind
+def saveWorkbookAtomic(workbook, filePath):
+    """
+    Saves a workbook to a temporary file and renames it over the target once it is complete
+
+    :param workbook: the openpyxl workbook to save
+    :param filePath: a Path for the final location of the workbook
+    :returns: nothing
+    :raises: none
+    """
+    # The temporary name does not end in .xlsx so that it is never picked up as a result file
+    tempPath = filePath.with_name('.' + filePath.name + '.tmp')
+    try:
+        with open(tempPath, 'wb') as tempFile:
+            workbook.save(tempFile)
+            tempFile.flush()
+            os.fsync(tempFile.fileno())
+        os.replace(tempPath, filePath)
+    finally:
+        if tempPath.exists():
+            os.remove(tempPath)
+
+# Function that commits a processed file's results to the journal
+def appendJournalEntry(journalPath, entry):
+    """
+    Appends one result row to the journal and flushes it to disk before returning
+
+    :param journalPath: a Path for the journal file
+    :param entry: a list of [rmid, drillCurveAvg, feedCurveAvg, filename] to record
+    :returns: nothing
+    :raises: none
+    """
+    with open(journalPath, 'ab+') as journalFile:
+        # Start a fresh line if a crash left a torn entry at the end of the journal
+        journalFile.seek(0, os.SEEK_END)
+        if journalFile.tell() > 0:
+            journalFile.seek(-1, os.SEEK_END)
+            if journalFile.read(1) != b'\n':
+                journalFile.write(b'\n')
+        journalFile.write((json.dumps(entry) + '\n').encode())
+        journalFile.flush()
+        os.fsync(journalFile.fileno())
+
+# Function that reads back the result rows recorded in the journal
+def readJournal(journalPath):
+    """
+    Returns the result rows recorded in the journal, ignoring a torn final line from a crash
+
+    :param journalPath: a Path for the journal file
+    :returns: a list of [rmid, drillCurveAvg, feedCurveAvg, filename] lists
+    :raises: none
+    """
+    entries = []
+    journaledFilenames = set()
+    if not journalPath.is_file():
+        return entries
+
+    with open(journalPath) as journalFile:
+        for line in journalFile:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry[3] not in journaledFilenames:
+                journaledFilenames.add(entry[3])
+                entries.append(entry)
+
+    return entries
+
 # Function for fixing grammar to append an 's'
 def pluralSFix(num):
     if num is 1:
@@ -118,6 +187,10 @@ workPath = Path(workDir)
 dataPath = Path(dataDir)
 resultPath = Path(resultDir)
 summaryFilePath = Path(workDir + thesisSumFileDir + baseSumFilename)
+journalPath = summaryFilePath.with_suffix('.journal')
+
+# Resume mode replays the journal of an interrupted run into the summary file
+resumeMode = '--resume' in sys.argv[1:]
 
 # Creates the Results directory
 if not resultPath.exists():
@@ -135,6 +208,22 @@ resultFileListLen = len(resultFileList)
 # Initializing global variables
 numNewFiles = 0
 summaryData = []
+
+# Results in the journal were saved by an earlier run but never made it into the summary file
+if resumeMode:
+    # Entries without a valid result file were interrupted before the save and get recomputed below
+    for journalEntry in readJournal(journalPath):
+        journalResultPath = Path(resultDir + pathSep + journalEntry[3])
+        if journalResultPath.is_file() and zipfile.is_zipfile(journalResultPath):
+            summaryData.append(journalEntry)
+    numNewFiles = len(summaryData)
+    print('Replayed %s result%s from %s' % (numNewFiles, pluralSFix(numNewFiles), journalPath.name))
+    clearJournal = True
+elif journalPath.is_file():
+    print('Found %s from an interrupted run, use --resume to add its results to %s' % (journalPath.name, summaryFilePath.name))
+    clearJournal = False
+else:
+    clearJournal = True
     
 # Define the RegEx to find the necessary data to gather in the file
 dataRegex = re.compile(r'''(
@@ -152,7 +241,7 @@ for filePathIndex in range(dataFileListLen):
     oldFilename = dataFileList[filePathIndex].name
     newFilename = dataFileList[filePathIndex].stem.replace(' ', '_')
     newFilePath = Path(resultDir + pathSep + newFilename + '.xlsx')
-    if newFilePath.is_file():
+    if newFilePath.is_file() and zipfile.is_zipfile(newFilePath):
         continue
     print('Processing file... %s' % oldFilename)
 
@@ -261,12 +350,14 @@ for filePathIndex in range(dataFileListLen):
     chartObj.append(feedCurveSeries)
     sheet.add_chart(chartObj, 'D2')
 
+    # Store the required data for the results summary file and commit it to the journal before
+    # the result file exists, so a skipped result file always has its data in the journal
+    summaryData.append([rmid, drillCurveAvg, feedCurveAvg, newFilePath.name])
+    appendJournalEntry(journalPath, summaryData[-1])
+
     # Save the file after all edits are finished being made
     print('Generated new file... %s' % (newFilePath.name))
-    wb.save(os.path.abspath(newFilePath))
-    
-    # Store the required data for the results summary file
-    summaryData.append([rmid, drillCurveAvg, feedCurveAvg, newFilePath.name])
+    saveWorkbookAtomic(wb, newFilePath)
     numNewFiles += 1
 
 # Calculate length of summaryData to be used next
@@ -339,7 +430,7 @@ if not summaryFilePath.is_file():
     writeData2Spreadsheet(summarySheet, summaryData, sumDataLen, 2, 'center')
 
     # Save the new results summary file
-    summaryWorkbook.save(os.path.abspath(summaryFilePath))
+    saveWorkbookAtomic(summaryWorkbook, summaryFilePath)
     print('Saved %s result%s into %s' % (numNewFiles, pluralSFix(numNewFiles), summaryFilePath.name))
 
 elif numNewFiles is 0:
@@ -369,11 +460,17 @@ else:
             # Update the summary file with the new results
             newSummaryDataRow = [[summaryData[i][0], summaryData[i][1], summaryData[i][2], summaryData[i][3]]]
             writeData2Spreadsheet(summarySheet, newSummaryDataRow, 1, lastRow + 1, 'center')
+            processedFileList.append(summaryData[i][3])
+            lastRow += 1
 
     # Save the updates made to the summary file
-    summaryWorkbook.save(os.path.abspath(summaryFilePath))
+    saveWorkbookAtomic(summaryWorkbook, summaryFilePath)
     print('Saved %s new result%s into %s' % (numNewFiles, pluralSFix(numNewFiles), summaryFilePath.name))
 
+# Every journaled result is now in the summary file so the journal can be cleared
+if clearJournal and journalPath.is_file():
+    os.remove(journalPath)
+
 
         
 
@@ -0,0 +1,2 @@
+@py.exe C:\Users\Natalie\Documents\School\NSERC\Thesis\Python_Files\queryWoodData.py %*
+@pause
\ No newline at end of file
@@ -0,0 +1,331 @@
+#! usr/bin/python3
+# queryWoodData.py - Queries and aggregates the results summarized by analyzeWoodData.py
+# Made for Natalie by Michael
+#
+# *** Remember to change the shebang line to #! python3 for Windows ***
+#
+# The RMID column of the summary file only holds the last three digits of the specimen number, so
+# B95001 and C96001 share RMID 1. The index also stores the full specimen number parsed from the
+# filename (95001 for Measurements_B95001.xlsx), which is what ranges over specimens should use.
+# The letter prefix is not part of that number, so filter on it with filename~B.
+#
+# Examples:     queryWoodData.py --range specimen 95000 95999 --agg mean
+#               queryWoodData.py --where "feed<1000" --format csv
+#               queryWoodData.py --group-by specimen --bucket 1000 --agg count mean max
+#               queryWoodData.py --top 5 --sort drill --desc
+
+import os, re, csv, sys, json, bisect, argparse, getpass
+from pathlib import Path
+
+# Columns of the index, the specimen number is parsed from the filename and the rest come from the summary file
+FIELDS = ['specimen', 'rmid', 'drill', 'feed', 'filename']
+NUMERIC_FIELDS = ['specimen', 'rmid', 'drill', 'feed']
+AGGREGATES = ['count', 'sum', 'mean', 'min', 'max']
+
+# Define the RegEx for a --where predicate such as "feed<1000" or "filename~B950"
+predicateRegex = re.compile(r'''^\s*
+    (specimen|rmid|drill|feed|filename)  # Field to compare
+    \s*
+    (<=|>=|==|!=|<|>|~)         # Comparison operator, ~ is a substring match
+    \s*
+    (.+?)                       # Value to compare against
+    \s*$''', re.VERBOSE)
+
+specimenRegex = re.compile(r"(\d+)(\.xlsx)$")
+
+# Function that builds the index from the results summary file
+def buildIndex(summaryFilePath, indexPath):
+    """
+    Reads the results summary file into a list of rows sorted by specimen number and caches it as JSON
+
+    :param summaryFilePath: a Path for the results summary file
+    :param indexPath: a Path for the cached index file
+    :returns: a dict of the index with the 'rows' and the sorted 'specimens' column used for range lookups
+    :raises: none
+    """
+    # Only imported here so that queries against an up to date index do not pay for loading openpyxl
+    import openpyxl
+
+    summaryWorkbook = openpyxl.load_workbook(summaryFilePath, read_only=True)
+    summarySheet = summaryWorkbook[summaryFilePath.stem]
+
+    rows = []
+    for row in summarySheet.iter_rows(min_row=2, max_col=4, values_only=True):
+        if row[0] is None:
+            continue
+        specimenMatch = specimenRegex.search(str(row[3]))
+        specimen = int(specimenMatch.group(1)) if specimenMatch else None
+        rows.append([specimen, int(row[0]), row[1], row[2], row[3]])
+    summaryWorkbook.close()
+
+    # Rows without a specimen number go last so that the specimens column stays sortable
+    rows = sorted(rows, key=lambda row: (row[0] is None, row[0] or 0, row[4] or ''))
+    specimens = [row[0] for row in rows if row[0] is not None]
+
+    # Write the index next to the summary file so later queries never need to open it
+    index = {'summaryMtime': summaryFilePath.stat().st_mtime, 'fields': FIELDS, 'rows': rows, 'specimens': specimens}
+    tempPath = indexPath.with_name('.' + indexPath.name + '.tmp')
+    with open(tempPath, 'w') as indexFile:
+        json.dump(index, indexFile)
+    os.replace(tempPath, indexPath)
+
+    return index
+
+# Function that loads the index, rebuilding it if the summary file has changed
+def loadIndex(summaryFilePath, indexPath, rebuild):
+    """
+    Returns the index, only reading the summary file when the cached index is stale
+
+    :param summaryFilePath: a Path for the results summary file
+    :param indexPath: a Path for the cached index file
+    :param rebuild: a boolean that forces the index to be rebuilt
+    :returns: a dict of the index with the 'rows' and the sorted 'specimens' column used for range lookups
+    :raises: none
+    """
+    if not rebuild and indexPath.is_file():
+        try:
+            with open(indexPath) as indexFile:
+                index = json.load(indexFile)
+            if index['summaryMtime'] == summaryFilePath.stat().st_mtime and index['fields'] == FIELDS:
+                return index
+        except (ValueError, KeyError):
+            pass
+
+    print('Building index... %s' % indexPath.name, file=sys.stderr)
+    return buildIndex(summaryFilePath, indexPath)
+
+# Function that turns a --where string into a test on a row
+def parsePredicate(text):
+    """
+    Returns a function that checks a row against a predicate such as "feed<1000"
+
+    :param text: a string of the form <field><operator><value>
+    :returns: a function that takes a row and returns True if it matches
+    :raises: argparse.ArgumentTypeError if the predicate cannot be parsed
+    """
+    match = predicateRegex.match(text)
+    if match is None:
+        raise argparse.ArgumentTypeError('invalid predicate: %s' % text)
+
+    field, operator, value = match.groups()
+    colIndex = FIELDS.index(field)
+    if operator == '~':
+        return lambda row: value in str(row[colIndex])
+    if field in NUMERIC_FIELDS:
+        try:
+            value = float(value)
+        except ValueError:
+            raise argparse.ArgumentTypeError('%s needs a numeric value: %s' % (field, text))
+
+    comparisons = {
+        '<': lambda a, b: a < b,
+        '<=': lambda a, b: a <= b,
+        '>': lambda a, b: a > b,
+        '>=': lambda a, b: a >= b,
+        '==': lambda a, b: a == b,
+        '!=': lambda a, b: a != b,
+    }
+    compare = comparisons[operator]
+    return lambda row: row[colIndex] is not None and compare(row[colIndex], value)
+
+# Function that filters the indexed rows
+def filterRows(index, ranges, predicates):
+    """
+    Returns the rows that fall within every range and match every predicate
+
+    :param index: a dict of the index with the 'rows' and the sorted 'specimens' column
+    :param ranges: a list of (field, min, max) tuples, both ends inclusive
+    :param predicates: a list of functions that take a row and return True if it matches
+    :returns: a list of the matching rows
+    :raises: none
+    """
+    rows = index['rows']
+
+    # The index stores the sorted specimens column so a specimen range is found by bisection on it
+    specimenRanges = [(low, high) for field, low, high in ranges if field == 'specimen']
+    if specimenRanges:
+        specimens = index['specimens']
+        startIndex = max(bisect.bisect_left(specimens, low) for low, high in specimenRanges)
+        endIndex = min(bisect.bisect_right(specimens, high) for low, high in specimenRanges)
+        rows = rows[startIndex:endIndex]
+
+    for field, low, high in ranges:
+        if field != 'specimen':
+            colIndex = FIELDS.index(field)
+            rows = [row for row in rows if row[colIndex] is not None and low <= row[colIndex] <= high]
+
+    for predicate in predicates:
+        rows = [row for row in rows if predicate(row)]
+
+    return rows
+
+# Function that calculates the aggregates of the drill and feed averages per group
+def aggregateRows(rows, groupBy, bucket, aggregates):
+    """
+    Groups the rows and calculates the requested aggregates of the drill and feed columns
+
+    :param rows: a list of [specimen, rmid, drill, feed, filename] lists
+    :param groupBy: the field to group on, or None to aggregate all rows together
+    :param bucket: an integer width to bin a numeric group field into, or None
+    :param aggregates: a list of aggregate names from AGGREGATES
+    :returns: a tuple of (column titles, list of result rows)
+    :raises: none
+    """
+    # Aggregating without a group always reports the 'all' group, even when no rows matched
+    groups = {}
+    if groupBy is None:
+        groups['all'] = []
+    for row in rows:
+        if groupBy is None:
+            key = 'all'
+        else:
+            key = row[FIELDS.index(groupBy)]
+            if bucket is not None and key is not None:
+                key = int(key // bucket * bucket)
+        groups.setdefault(key, []).append(row)
+
+    titles = [groupBy or 'group']
+    for aggregate in aggregates:
+        if aggregate == 'count':
+            titles.append('count')
+        else:
+            titles.extend([aggregate + '_drill', aggregate + '_feed'])
+
+    results = []
+    for key in sorted(groups, key=lambda k: (k is None, k)):
+        groupRows = groups[key]
+        result = [key]
+        for aggregate in aggregates:
+            if aggregate == 'count':
+                result.append(len(groupRows))
+                continue
+            for colIndex in (FIELDS.index('drill'), FIELDS.index('feed')):
+                values = [row[colIndex] for row in groupRows if row[colIndex] is not None]
+                if not values:
+                    result.append(None)
+                elif aggregate == 'sum':
+                    result.append(sum(values))
+                elif aggregate == 'mean':
+                    result.append(round(sum(values) / len(values), 2))
+                elif aggregate == 'min':
+                    result.append(min(values))
+                elif aggregate == 'max':
+                    result.append(max(values))
+        results.append(result)
+
+    return titles, results
+
+# Function that writes the results to stdout in the requested format
+def printResults(titles, results, outputFormat):
+    """
+    Prints the results as an aligned table, CSV or JSON
+
+    :param titles: a list of column titles
+    :param results: a list of result rows
+    :param outputFormat: a string value of 'table', 'csv' or 'json'
+    :returns: nothing
+    :raises: none
+    """
+    if outputFormat == 'json':
+        print(json.dumps([dict(zip(titles, result)) for result in results], indent=2))
+
+    elif outputFormat == 'csv':
+        writer = csv.writer(sys.stdout, lineterminator='\n')
+        writer.writerow(titles)
+        writer.writerows(results)
+
+    else:
+        cells = [titles] + [['' if value is None else str(value) for value in result] for result in results]
+        widths = [max(len(row[i]) for row in cells) for i in range(len(titles))]
+        for rowIndex, row in enumerate(cells):
+            print('  '.join(value.ljust(widths[i]) for i, value in enumerate(row)).rstrip())
+            if rowIndex == 0:
+                print('  '.join('-' * width for width in widths))
+
+# Command line arguments
+parser = argparse.ArgumentParser(description='Query the results summarized by analyzeWoodData.py. '
+                                 'The rmid column only holds the last three digits of the specimen number, '
+                                 'use specimen for the full number parsed from the filename (95001 for '
+                                 'Measurements_B95001.xlsx).')
+parser.add_argument('--range', nargs=3, action='append', default=[], metavar=('FIELD', 'MIN', 'MAX'),
+                    help='keep rows with MIN <= FIELD <= MAX, where FIELD is one of %s' % ', '.join(NUMERIC_FIELDS))
+parser.add_argument('--where', type=parsePredicate, action='append', default=[], metavar='PREDICATE',
+                    help='keep rows matching a predicate such as "feed<1000" or "filename~B950"')
+parser.add_argument('--group-by', choices=FIELDS, help='aggregate the drill and feed averages per value of a field')
+parser.add_argument('--bucket', type=int, help='bin a numeric --group-by field into groups of this width')
+parser.add_argument('--agg', nargs='+', choices=AGGREGATES, help='aggregates to calculate (default: count mean)')
+parser.add_argument('--sort', metavar='COLUMN', help='output column to sort on, such as drill or mean_feed')
+parser.add_argument('--desc', action='store_true', help='sort in descending order')
+parser.add_argument('--top', type=int, metavar='K', help='only output the first K rows')
+parser.add_argument('--format', choices=['table', 'csv', 'json'], default='table', help='output format')
+parser.add_argument('--rebuild', action='store_true', help='rebuild the index from the results summary file')
+args = parser.parse_args()
+
+ranges = []
+for field, low, high in args.range:
+    if field not in NUMERIC_FIELDS:
+        parser.error('--range field must be one of %s' % ', '.join(NUMERIC_FIELDS))
+    try:
+        ranges.append((field, float(low), float(high)))
+    except ValueError:
+        parser.error('--range bounds must be numeric: %s %s' % (low, high))
+
+if args.bucket is not None and args.group_by not in NUMERIC_FIELDS:
+    parser.error('--bucket needs a numeric --group-by field')
+if args.bucket is not None and args.bucket <= 0:
+    parser.error('--bucket must be a positive integer')
+if args.top is not None and args.top <= 0:
+    parser.error('--top must be a positive integer')
+
+# Check whether the script is being run on Windows or Linux
+cwd = Path(os.getcwd())
+if cwd.anchor == 'C:\\':
+    isWin = True
+    isLnx = False
+elif cwd.anchor == '/':
+    isLnx = True
+    isWin = False
+
+if isLnx:
+    basePath = '/home/'
+    baseDir = '/Projects/Python_Learning/Wood_Data_Analysis/'
+    thesisSumFileDir = '04_Result Evaluation'
+    baseSumFilename = '/RM_Results.xlsx'
+
+elif isWin:
+    basePath = 'C:\\Users\\'
+    baseDir = '\\Documents\\School\\NSERC\\Thesis\\'
+    thesisSumFileDir = '04_Result Evaluation\\Input'
+    baseSumFilename = '\\RM_Results.xlsx'
+
+# Working directory Paths
+workDir = (basePath + getpass.getuser() + baseDir)
+summaryFilePath = Path(workDir + thesisSumFileDir + baseSumFilename)
+indexPath = summaryFilePath.with_suffix('.index.json')
+
+if not summaryFilePath.is_file():
+    sys.exit('No results summary file found at %s, run analyzeWoodData.py first' % summaryFilePath)
+
+# Load the index and filter it down to the matching rows
+index = loadIndex(summaryFilePath, indexPath, args.rebuild)
+rows = filterRows(index, ranges, args.where)
+
+if args.group_by is not None or args.agg is not None:
+    titles, results = aggregateRows(rows, args.group_by, args.bucket, args.agg or ['count', 'mean'])
+else:
+    titles, results = FIELDS, rows
+
+# Sort and trim the results for top-k queries
+if args.sort is not None:
+    if args.sort not in titles:
+        parser.error('--sort must be one of the output columns: %s' % ', '.join(titles))
+    colIndex = titles.index(args.sort)
+
+    # Rows without a value always go last, whichever direction is sorted
+    results = (sorted([result for result in results if result[colIndex] is not None],
+                      key=lambda result: result[colIndex], reverse=args.desc)
+               + [result for result in results if result[colIndex] is None])
+if args.top is not None:
+    results = results[:args.top]
+
+printResults(titles, results, args.format)